@@ -20,11 +20,26 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import collections
 import c4d
+import re
 
-try: from cStringIO import StringIO
-except ImportError: from StringIO import StringIO
+# Maps the codepoints that need escaping to their stringtable escape
+# sequence. Built lazily on the first call to #unicode_refreplace().
+_escape_table = None
+
+# Matches the first character that needs escaping, if any. The usual
+# input is plain ASCII without control characters and can be returned
+# without translating at all.
+_escape_probe = re.compile(u'[\n\r\t\b\x80-\uffff]')
+
+
+def _build_escape_table():
+  table = {}
+  for code in xrange(0x80, 0x10000):
+    table[code] = u'\\u%04X' % code
+  for char in u'\n\r\t\b':
+    table[ord(char)] = u'\\u%04X' % ord(char)
+  return table
 
 
 def unicode_refreplace(ustring):
@@ -33,20 +48,14 @@ def unicode_refreplace(ustring):
   Cinema 4D stringtable unicode escape sequences. Returns a binary string.
   '''
 
+  global _escape_table
   if not isinstance(ustring, unicode):
     ustring = ustring.decode('utf8')
-
-  fp = StringIO()
-  for char in ustring:
-    try:
-      if char in '\n\r\t\b':
-        raise UnicodeEncodeError
-      char = char.encode('ascii')
-    except UnicodeEncodeError:
-      char = '\\u' + ('%04x' % ord(char)).upper()
-    fp.write(char)
-
-  return fp.getvalue()
+  if _escape_probe.search(ustring) is None:
+    return ustring.encode('ascii')
+  if _escape_table is None:
+    _escape_table = _build_escape_table()
+  return ustring.translate(_escape_table).encode('ascii')
 
 
 def get_subcontainer(bc, sub_id, create=False):
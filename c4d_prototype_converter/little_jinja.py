@@ -23,21 +23,23 @@
 import collections
 import re
 
-try: from cStringIO import StringIO
-except ImportError: from StringIO import StringIO
-
 
 class RegexScanner(object):
   """
   Helper class to parse a string using regex patterns.
   """
 
+  __slots__ = ('string', 'offset', 'rules', 'previous', 'current',
+               '_master', '_by_name')
+
   def __init__(self, string):
     self.string = string
     self.offset = 0
     self.rules = []
     self.previous = None
     self.current = None
+    self._master = None
+    self._by_name = None
 
   def __bool__(self):
     if self.current is not None and self.current[0] is None:
@@ -54,19 +56,40 @@ class RegexScanner(object):
 
   def rule(self, name, pattern, flags=0):
     self.rules.append((name, re.compile(pattern, flags)))
+    self._master = None
+
+  def _search(self):
+    # All rules are fused into a single alternation so that every token
+    # costs one search over the string instead of one per rule. The rule
+    # names double as group names, which lets us map the winning
+    # alternative back to its rule and re-match it for the capture
+    # groups the callers expect.
+    if self._master is None:
+      self._by_name = dict(self.rules)
+      self._master = re.compile('|'.join(
+        '(?P<{}>{})'.format(name, pattern.pattern)
+        for name, pattern in self.rules))
+    match = self._master.search(self.string, self.offset)
+    if not match:
+      return None
+    name = match.lastgroup
+    return (name, self._by_name[name].match(self.string, match.start()))
 
   def next(self, rule_names=None):
     if self.current and self.current[0] is None:
       return self.current
-    nearest = None
-    nearest_index = None
-    for name, pattern in self.rules:
-      if rule_names is not None and name not in rule_names:
-        continue
-      match = pattern.search(self.string, self.offset)
-      if match and (nearest is None or match.start() < nearest_index):
-        nearest = (name, match)
-        nearest_index = match.start()
+    if rule_names is None:
+      nearest = self._search()
+    else:
+      nearest = None
+      nearest_index = None
+      for name, pattern in self.rules:
+        if name not in rule_names:
+          continue
+        match = pattern.search(self.string, self.offset)
+        if match and (nearest is None or match.start() < nearest_index):
+          nearest = (name, match)
+          nearest_index = match.start()
     if nearest:
       self.offset = nearest[1].end()
       result = nearest
@@ -104,36 +127,46 @@ class RegexScanner(object):
       self.offset = newline + 1
 
 
-def little_jinja(template_string, context):
-  """
-  A very lightweight implementation of the Jinja template rendering engine.
-  The following syntax is supported:
+def _compile_expr(source):
+  # Expressions are compiled once at parse time; eval() happily accepts
+  # the resulting code object, so every render skips the re-parse.
+  return compile(source.strip(), '<little_jinja>', 'eval')
 
-  * `{{ expr }}`
-  * `{% if <cond> %}{% elif <cond> %}{% else %}{% endif %}`
-  * `{% for <vars> in <expr> %}{% endif %}`
 
-  The control-flow tags may be used as `{%-` and/or `-%}` to strip the
-  content of the line before or after the tag, respectively.
-  """
+# The template grammar, compiled once instead of per #little_jinja() call.
+_rules = [
+  ('var', re.compile(r'\{\{(.*?)\}\}')),
+  ('if', re.compile(r'\{%-?\s*if\b(.*?)-?%\}')),
+  ('elif', re.compile(r'\{%-?\s*elif\b(.*?)-?%\}')),
+  ('else', re.compile(r'\{%-?\s*else\s*-?%\}')),
+  ('endif', re.compile(r'\{%-?\s*endif\s*-?%\}')),
+  ('for', re.compile(r'\{%-?\s*for\s+(.*?)\s+in\s+(.*?)\s*-?%\}')),
+  ('endfor', re.compile(r'\{%-?\s*endfor\s*-?%\}')),
+]
+
+
+class Node(object):
+  def __init__(self, type, data, sub):
+    self.type = type
+    self.data = data
+    self.sub = sub
+
+
+# Parsed template trees keyed by the template string. The same few
+# templates are rendered over and over (eg. for every entry in the
+# file list preview), so parsing each of them once is enough.
+_parse_cache = {}
 
+
+def _parse(template_string):
   scanner = RegexScanner(template_string)
-  scanner.rule('var', r'\{\{(.*?)\}\}')
-  scanner.rule('if', r'\{%-?\s*if\b(.*?)-?%\}')
-  scanner.rule('elif', r'\{%-?\s*elif\b(.*?)-?%\}')
-  scanner.rule('else', r'\{%-?\s*else\s*-?%\}')
-  scanner.rule('endif', r'\{%-?\s*endif\s*-?%\}')
-  scanner.rule('for', r'\{%-?\s*for\s+(.*?)\s+in\s+(.*?)\s*-?%\}')
-  scanner.rule('endfor', r'\{%-?\s*endfor\s*-?%\}')
-
-  class Node(object):
-    def __init__(self, type, data, sub):
-      self.type = type
-      self.data = data
-      self.sub = sub
+  scanner.rules.extend(_rules)
 
   root = Node('root', None, [])
   open_blocks = [root]
+  # Innermost open if-blocks, so elif/else find their if in O(1) instead
+  # of scanning open_blocks backwards.
+  if_stack = []
 
   for kind, match in scanner:
     prev_text = Node('text', scanner.behind(), None)
@@ -141,24 +174,26 @@ def little_jinja(template_string, context):
     strip_left = match.group(0).startswith('{%-')
     strip_right = match.group(0).endswith('-%}')
     if kind == 'var':
-      open_blocks[-1].sub.append(Node('var', match.group(1), None))
+      open_blocks[-1].sub.append(Node('var', _compile_expr(match.group(1)), None))
     elif kind in ('if', 'elif', 'else', 'endif'):
       if kind == 'if':
-        if_node = Node('if', {'elif': [], 'else': None, 'cond': match.group(1), 'index': match.start()}, [])
+        if_node = Node('if', {'elif': [], 'else': None,
+          'cond': _compile_expr(match.group(1)), 'index': match.start()}, [])
         open_blocks[-1].sub.append(if_node)
         open_blocks.append(if_node)
+        if_stack.append(if_node)
       elif kind == 'elif':
         if open_blocks[-1].type not in ('if', 'elif'):
           raise ValueError('unmatched "elif" instruction')
-        elif_node = Node('elif', {'cond': match.group(1)}, [])
-        if_node = next(x for x in reversed(open_blocks) if x.type == 'if')
+        elif_node = Node('elif', {'cond': _compile_expr(match.group(1))}, [])
+        if_node = if_stack[-1]
         if_node.data['elif'].append(elif_node)
         open_blocks.append(elif_node)
       elif kind == 'else':
         if open_blocks[-1].type not in ('if', 'elif'):
           raise ValueError('unmatched "else" instruction')
         else_node = Node('else', None, [])
-        if_node = next(x for x in reversed(open_blocks) if x.type == 'if')
+        if_node = if_stack[-1]
         if if_node.data['else']:
           raise ValueError('multiple "else" instructions')
         if_node.data['else'] = else_node
@@ -170,12 +205,14 @@ def little_jinja(template_string, context):
           open_blocks.pop()
         assert open_blocks[-1].type == 'if'
         open_blocks.pop()
+        if_stack.pop()
       else:
         assert False, kind
     elif kind in ('for', 'endfor'):
       if kind == 'for':
         varnames, expr = match.group(1), match.group(2)
-        for_node = Node('for', {'varnames': varnames.split(','), 'expr': expr, 'index': match.start()}, [])
+        for_node = Node('for', {'varnames': varnames.split(','), 'expr_src': expr,
+          'expr': _compile_expr(expr), 'index': match.start()}, [])
         open_blocks[-1].sub.append(for_node)
         open_blocks.append(for_node)
       elif kind == 'endfor':
@@ -199,12 +236,33 @@ def little_jinja(template_string, context):
     raise ValueError('invalid template: unclosed {} block at line {}'
       .format(node.type, line))
 
-  out = StringIO()
+  return root
+
+
+def little_jinja(template_string, context):
+  """
+  A very lightweight implementation of the Jinja template rendering engine.
+  The following syntax is supported:
+
+  * `{{ expr }}`
+  * `{% if <cond> %}{% elif <cond> %}{% else %}{% endif %}`
+  * `{% for <vars> in <expr> %}{% endif %}`
+
+  The control-flow tags may be used as `{%-` and/or `-%}` to strip the
+  content of the line before or after the tag, respectively.
+  """
+
+  try:
+    root = _parse_cache[template_string]
+  except KeyError:
+    root = _parse_cache[template_string] = _parse(template_string)
+
+  parts = []
   def render(node, context):
     if node.type == 'text':
-      out.write(node.data)
+      parts.append(node.data)
     elif node.type == 'var':
-      out.write(str(eval(node.data, context)))
+      parts.append(str(eval(node.data, context)))
     elif node.type == 'if':
       tests = [node] + node.data['elif']
       for cond_node in tests:
@@ -225,7 +283,7 @@ def little_jinja(template_string, context):
         else:
           if len(item) != len(node.data['varnames']):
             raise ValueError('unpacking of "{}" failed at index {}'
-              .format(node.data['expr'], index))
+              .format(node.data['expr_src'], index))
           for varname, value in zip(node.data['varnames'], item):
             sub_context[varname.strip()] = value
         for child in node.sub:
@@ -235,4 +293,4 @@ def little_jinja(template_string, context):
   for node in root.sub:
     render(node, context)
 
-  return out.getvalue()
+  return ''.join(parts)
@@ -33,10 +33,34 @@ from lib2to3.pgen2 import token
 from lib2to3.pgen2.parse import ParseError
 from lib2to3.pygram import python_symbols
 from lib2to3 import refactor
+import re
+
+
+def _normalize(code):
+  '''
+  Returns *code* the way it comes out of a #refactor_string() round-trip
+  that did not apply any transformation. Used by the fast paths below to
+  skip a full parse when a fixer cannot possibly match.
+  '''
+
+  return code.rstrip() + '\n'
 
 
 class RefactoringTool(refactor.RefactoringTool):
 
+  # One pgen2 driver (with its grammar) shared by every instance. The
+  # fixers differ from call to call but the grammar never does, and the
+  # base constructor copies the full grammar for each new tool.
+  _shared_driver = None
+
+  def __init__(self, fixers, options=None, explicit=None):
+    refactor.RefactoringTool.__init__(self, fixers, options, explicit)
+    if RefactoringTool._shared_driver is None:
+      RefactoringTool._shared_driver = self.driver
+    else:
+      self.driver = RefactoringTool._shared_driver
+      self.grammar = self.driver.grammar
+
   def get_fixers(self):
     pre_order_fixers = []
     post_order_fixers = []
@@ -60,6 +84,24 @@ def refactor_string(fixers, code, filename='<string>'):
   return rt.refactor_string(code, filename)
 
 
+def _tree_to_string(tree, original):
+  '''
+  Serializes a refactored *tree* back to text, reusing the *original*
+  (normalized) code when no fixer actually changed the tree. Serializing
+  an unchanged CST walks every leaf just to reproduce the input.
+  '''
+
+  if not getattr(tree, 'was_changed', True):
+    return original
+  return str(tree)
+
+
+# Caches compiled fixer patterns across refactoring passes. Pattern
+# compilation involves building a full pattern grammar tree and is by far
+# the most expensive part of instantiating a fixer.
+_pattern_cache = {}
+
+
 class DelayBindBaseFix(BaseFix):
 
   def __init__(self):
@@ -70,6 +112,19 @@ class DelayBindBaseFix(BaseFix):
     super(DelayBindBaseFix, self).__init__(options, log)
     return self
 
+  def compile_pattern(self):
+    # The cache is keyed on the pattern source, so instance-level
+    # patterns such as FixFunctionDef's per-funcname pattern are shared
+    # between fixer instances as well.
+    if self.PATTERN is None:
+      BaseFix.compile_pattern(self)
+      return
+    try:
+      self.pattern, self.pattern_tree = _pattern_cache[self.PATTERN]
+    except KeyError:
+      BaseFix.compile_pattern(self)
+      _pattern_cache[self.PATTERN] = (self.pattern, getattr(self, 'pattern_tree', None))
+
 
 class FixFunctionDef(DelayBindBaseFix):
   """
@@ -80,12 +135,9 @@ class FixFunctionDef(DelayBindBaseFix):
   This fixer only matches global function defs.
   """
 
-  PATTERN = "funcdef< 'def' name='{}' any* >"
-
   def __init__(self, funcname, newname, pre_params=None, post_params=None,
                remove=False, add_statement=None):
     super(FixFunctionDef, self).__init__()
-    self.PATTERN = self.PATTERN.format(funcname)
     self.funcname = funcname
     self.newname = newname
     self.pre_params = pre_params or []
@@ -93,6 +145,48 @@ class FixFunctionDef(DelayBindBaseFix):
     self.remove = remove
     self.add_statement = add_statement
     self.results = []
+    self._indent = None
+    # Child handlers keyed by node type; transform() visits every child
+    # of a matched funcdef and a lookup beats the isinstance/type branch
+    # chain it replaces.
+    self._dispatch = {
+      token.NAME: self._fix_name,
+      python_symbols.parameters: self._fix_parameters,
+      python_symbols.suite: self._read_indent,
+    }
+
+  def _fix_name(self, child):
+    if child.value == self.funcname:
+      child.value = self.newname
+
+  def _read_indent(self, child):
+    self._indent = find_indentation(child)
+
+  def _fix_parameters(self, child):
+    # Rebuild the parameter list in a single pass instead of splicing
+    # into the middle of the children list twice.
+    new_children = child.children[:1]
+    for param in self.pre_params:
+      new_children.append(Leaf(token.NAME, param))
+      new_children.append(Leaf(token.COMMA, ', '))
+    new_children.extend(child.children[1:-1])
+    for param in self.post_params:
+      new_children.append(Leaf(token.COMMA, ','))
+      new_children.append(Leaf(token.NAME, param))
+    new_children.append(child.children[-1])
+    if new_children[-2].type == token.COMMA:
+      new_children.pop(-2)
+    child.children[:] = new_children
+    child.changed()
+
+  def match(self, node, _Node=Node, _funcdef=python_symbols.funcdef):
+    # Matching "funcdef< 'def' name='...' any* >" by hand skips the whole
+    # pattern unification machinery for every node in the tree. The
+    # default arguments bind the module-level lookups once; match() runs
+    # for every node of the parsed script.
+    return (isinstance(node, _Node) and node.type == _funcdef
+            and len(node.children) >= 2
+            and node.children[1].value == self.funcname)
 
   def transform(self, node, results):
     # Determine the node's column number by finding the first leaf.
@@ -103,27 +197,22 @@ class FixFunctionDef(DelayBindBaseFix):
     if leaf.column != 0:
       return
 
-    indent = None
+    self._indent = None
+    dispatch = self._dispatch
     for child in node.children:
-      if isinstance(child, Node) and child.type == python_symbols.suite:
-        indent = find_indentation(child)
-      if isinstance(child, Leaf) and child.type == token.NAME and child.value == self.funcname:
-        child.value = self.newname
-      elif isinstance(child, Node) and child.type == python_symbols.parameters:
-        pre_params = []
-        for param in self.pre_params:
-          pre_params.append(Leaf(token.NAME, param))
-          pre_params.append(Leaf(token.COMMA, ', '))
-        child.children[1:1] = pre_params
-        post_params = []
-        for param in self.post_params:
-          post_params.append(Leaf(token.COMMA, ','))
-          post_params.append(Leaf(token.NAME, param))
-        child.children[-1:-1] = post_params
-        if child.children[-2].type == token.COMMA:
-          child.children.pop(-2)
-        child.changed()
+      handler = dispatch.get(child.type)
+      if handler is not None:
+        handler(child)
+    indent = self._indent
     if self.add_statement:
+      # Blank lines that trailed the function in the source end up in
+      # the prefixes of its closing DEDENT tokens; drop them so the
+      # appended statement directly follows the body.
+      for leaf in reversed(list(node.leaves())):
+        if leaf.type != token.DEDENT:
+          break
+        if not leaf.prefix.strip():
+          leaf.prefix = ''
       node.children.append(Leaf(0, indent + self.add_statement.rstrip() + '\n'))
     if self.remove:
       self.results.append(node)
@@ -137,19 +226,38 @@ class FixIndentation(DelayBindBaseFix):
 
   # Code from http://python3porting.com/fixers.html#modifying-the-parse-tree
 
+  # Maps closing bracket token types to their opening counterpart, and
+  # the set of opening bracket types. Class-level so transform() does
+  # not rebuild a tuple of token attributes per leaf.
+  _CLOSING = {token.RPAR: token.LPAR, token.RBRACE: token.LBRACE,
+              token.RSQB: token.LSQB}
+  _OPENING = frozenset([token.LPAR, token.LBRACE, token.LSQB])
+
   def __init__(self, new_indent):
     self.indents = []
     self.compounds = []
     self.line = 0
     self.new_indent = new_indent
+    self._indent_cache = {}
 
-  def match(self, node):
-    if isinstance(node, Leaf):
-      return True
-    return False
+  def match(self, node, _Leaf=Leaf):
+    return isinstance(node, _Leaf)
+
+  def _indent(self, width):
+    # The same few indentation levels are needed for almost every token,
+    # memoize them instead of re-concatenating per leaf.
+    try:
+      return self._indent_cache[width]
+    except KeyError:
+      result = self._indent_cache[width] = self.new_indent * width
+      return result
 
   def _update_prefix(self, prefix, indent_width, add_indent=True):
-    indent = self.new_indent * indent_width
+    indent = self._indent(indent_width)
+    if '\n' not in prefix:
+      # Most prefixes hold nothing but the indentation of a single
+      # line; no need to split and rejoin in that case.
+      return indent if add_indent else ''
     prefix_lines = [x.strip() for x in prefix.split('\n')[:-1]]
     prefix_lines = [(indent + x) if x else '' for x in prefix_lines]
     if add_indent:
@@ -158,17 +266,18 @@ class FixIndentation(DelayBindBaseFix):
       prefix_lines.append('')
     return '\n'.join(prefix_lines)
 
-  def transform(self, node, results):
-    if node.type == token.INDENT:
+  def transform(self, node, results, _INDENT=token.INDENT,
+                _DEDENT=token.DEDENT):
+    if node.type == _INDENT:
       self.line = node.lineno
       self.indents.append(len(node.value))
-      new_indent = self.new_indent * len(self.indents)
+      new_indent = self._indent(len(self.indents))
       new_prefix = self._update_prefix(node.prefix, len(self.indents), False)
       if node.value != new_indent or new_prefix != node.prefix:
         node.value = new_indent
         node.prefix = new_prefix
         return node
-    elif node.type == token.DEDENT:
+    elif node.type == _DEDENT:
       self.line = node.lineno
       if node.column == 0:
         self.indents = []
@@ -188,11 +297,10 @@ class FixIndentation(DelayBindBaseFix):
             node.prefix = new_prefix
             # Return the modified node:
             return node
-    elif node.type in (token.LPAR, token.LBRACE, token.LSQB): # (, {, [
+    elif node.type in self._OPENING: # (, {, [
       self.compounds.append(node.type)
-    elif node.type in (token.RPAR, token.RBRACE, token.RSQB): # ), }, ]
-      m = {token.RPAR: token.LPAR, token.RBRACE: token.LBRACE, token.RSQB: token.LSQB}
-      assert self.compounds[-1] == m[node.type], (self.compounds[-1], node.type)
+    elif node.type in self._CLOSING: # ), }, ]
+      assert self.compounds[-1] == self._CLOSING[node.type], (self.compounds[-1], node.type)
       self.compounds.pop()
     if self.line != node.lineno:  # New line
       self.line = node.lineno
@@ -221,6 +329,12 @@ class FixStripFutureImports(DelayBindBaseFix):
 
   def __init__(self):
     self.imports = []
+    self._seen = set()
+
+  def _add_import(self, name):
+    if name not in self._seen:
+      self._seen.add(name)
+      self.imports.append(name)
 
   @property
   def future_line(self):
@@ -240,12 +354,11 @@ class FixStripFutureImports(DelayBindBaseFix):
       if isinstance(child, Node) and child.type == python_symbols.import_as_names:
         # from x import a, b
         for leaf in child.children:
-          if leaf.type == token.NAME and leaf.value not in self.imports:
-            self.imports.append(leaf.value)
+          if leaf.type == token.NAME:
+            self._add_import(leaf.value)
       elif isinstance(child, Leaf) and child.type == token.NAME:
         # from x import a
-        if child.value not in self.imports:
-          self.imports.append(child.value)
+        self._add_import(child.value)
     new = BlankLine()
     new.prefix = node.prefix
     return new
@@ -323,36 +436,80 @@ class FixStripMainCheck(DelayBindBaseFix):
     return BlankLine()
 
 
+# Matches empty or whitespace-only lines at the beginning and the end of
+# a string, or a string that consists of nothing but whitespace.
+_strip_empty_lines_re = re.compile(
+  r'\A\s+\Z|\A(?:[^\S\n]*\n)+|(?:\n[^\S\n]*)+\Z')
+
+
 def strip_empty_lines(string):
-  lines = []
-  for line in string.split('\n'):
-    if not lines and (not line or line.isspace()): continue
-    lines.append(line)
-  while lines and (not lines[-1] or lines[-1].isspace()):
-    lines.pop()
-  return '\n'.join(lines)
+  return _strip_empty_lines_re.sub('', string)
 
 
 def split_docstring(code):
+  code = _normalize(code)
   fixer = FixStripDocstrings()
-  return str(refactor_string([fixer], code)), strip_empty_lines(fixer.docstring or '')
+  tree = refactor_string([fixer], code)
+  return _tree_to_string(tree, code), strip_empty_lines(fixer.docstring or '')
 
 
 def split_future_imports(code):
+  if '__future__' not in code:
+    return _normalize(code), ''
+  code = _normalize(code)
   fixer = FixStripFutureImports()
-  return str(refactor_string([fixer], code)), strip_empty_lines(fixer.future_line or '')
+  tree = refactor_string([fixer], code)
+  return _tree_to_string(tree, code), strip_empty_lines(fixer.future_line or '')
 
 
 def split_and_refactor_global_function(code, func_name, new_func_name=None,
     prepend_args=None, append_args=None, add_statement=None):
+  if not re.search(r'\bdef\s+{}\b'.format(re.escape(func_name)), code):
+    return strip_empty_lines(code), ''
+  code = _normalize(code)
   fixer = FixFunctionDef(func_name, new_func_name, prepend_args, append_args,
     True, add_statement)
-  code = str(refactor_string([fixer], code))
+  code = _tree_to_string(refactor_string([fixer], code), code)
   functions = '\n'.join(strip_empty_lines(str(x)) for x in fixer.results)
   return strip_empty_lines(code), functions
 
 
+def split_and_refactor_global_functions(code, specs):
+  """
+  Like #split_and_refactor_global_function(), but extracts multiple
+  global functions with a single parse and tree traversal. *specs* is a
+  list of dictionaries accepted as keyword arguments by the
+  single-function variant. Returns the remaining code and a list with
+  the refactored source of every function, in the order of *specs*.
+  """
+
+  fixers = []
+  slots = []
+  for spec in specs:
+    if re.search(r'\bdef\s+{}\b'.format(re.escape(spec['func_name'])), code):
+      fixer = FixFunctionDef(spec['func_name'], spec.get('new_func_name'),
+        spec.get('prepend_args'), spec.get('append_args'), True,
+        spec.get('add_statement'))
+      fixers.append(fixer)
+      slots.append(fixer)
+    else:
+      slots.append(None)
+  if fixers:
+    code = _normalize(code)
+    code = _tree_to_string(refactor_string(fixers, code), code)
+  functions = []
+  for fixer in slots:
+    if fixer is None:
+      functions.append('')
+    else:
+      functions.append(
+        '\n'.join(strip_empty_lines(str(x)) for x in fixer.results))
+  return strip_empty_lines(code), functions
+
+
 def strip_main_check(code):
+  if '__main__' not in code:
+    return _normalize(code)
   return refactor_string([FixStripMainCheck()], code)
 
 
@@ -362,10 +519,14 @@ def fix_userdata_access(code, subfun):
   where `Y = subfun(X)`.
   """
 
+  if 'ID_USERDATA' not in code:
+    return _normalize(code)
+  code = _normalize(code)
   fixer = FixUserDataAccess(subfun)
-  return str(refactor_string([fixer], code))
+  return _tree_to_string(refactor_string([fixer], code), code)
 
 
 def indentation(code, indent):
+  code = _normalize(code)
   fixer = FixIndentation(indent)
-  return str(refactor_string([fixer], code))
+  return _tree_to_string(refactor_string([fixer], code), code)
@@ -37,29 +37,61 @@ def file_tree(items, parent=None, flat=False, key=None):
   if parent:
     items = [(os.path.relpath(k, parent), v) for k, v in items]
 
-  if flat:
-    order = []
   for filename, data in items:
+    # Walk up only until a known entry is hit -- everything above it was
+    # already created by an earlier file sharing the same prefix.
+    missing = []
     parent_entry = None
-    for path in reversed(list(path_parents(filename))):
-      entry = entries.get(path)
-      if not entry:
-        entry = DataNode(path, path!=filename, data)
-        if parent_entry:
-          parent_entry.add_child(entry)
-        entries[path] = entry
-        base = os.path.basename(path)
+    for path in path_parents(filename):
+      parent_entry = entries.get(path)
+      if parent_entry is not None:
+        break
+      missing.append(path)
+    for index in range(len(missing)-1, -1, -1):
+      path = missing[index]
+      entry = DataNode(path, path!=filename, data)
+      if parent_entry:
+        parent_entry.add_child(entry)
+      entries[path] = entry
       parent_entry = entry
-    if flat:
-      order.append(entry)
 
-  roots = (x for x in entries.values() if not x.parent)
+  roots = [x for x in entries.values() if not x.parent]
   if flat:
+    # Pre-order traversal, iteratively instead of per-node callbacks.
     result = []
-    [x.visit(lambda y: result.append(y)) for x in roots]
+    stack = list(reversed(roots))
+    while stack:
+      node = stack.pop()
+      result.append(node)
+      stack.extend(reversed(node.children))
     return result
   else:
-    return list(roots)
+    return roots
+
+
+def files_exist(paths):
+  """
+  Checks for every path in *paths* whether it points to an existing file
+  and returns the set of those that do. Every parent directory is listed
+  only once with #os.listdir() instead of issuing one stat per path;
+  only names found in the listing are stat'ed to rule out directories,
+  matching #os.path.isfile() semantics.
+  """
+
+  result = set()
+  listed = {}
+  for path in paths:
+    dirname, basename = os.path.split(path)
+    names = listed.get(dirname)
+    if names is None:
+      try:
+        names = frozenset(os.listdir(dirname))
+      except OSError:
+        names = frozenset()
+      listed[dirname] = names
+    if basename in names and os.path.isfile(path):
+      result.add(path)
+  return result
 
 
 COLOR_BLUE = c4d.Vector(0.5, 0.6, 0.9)
@@ -79,37 +111,66 @@ class FileList(BaseWidget):
     super(FileList, self).__init__(id)
     self.layout_flags = layout_flags
     self._parent_path = None
-    self._flat_nodes = []
+    self._entries = []
     self._optional_file_ids = set()
     self._overwrite = False
+    self._set_files_key = None
+    # Widget ids of the entries whose color depends on the overwrite
+    # flag, from the last render pass.
+    self._overwrite_widgets = []
 
   def set_files(self, files, parent, optional_file_ids):
     files = sorted(files.items(), key=lambda x: x[1].lower())
+    optional_file_ids = frozenset(optional_file_ids)
+    # Skip the tree rebuild and relayout when nothing visible changed.
+    # The set of files existing on disk is part of the key because it
+    # drives the entry colors (eg. right after a Create run).
+    key = (parent, tuple(files), optional_file_ids,
+           frozenset(files_exist(v for _, v in files)))
+    if key == self._set_files_key:
+      return
+    self._set_files_key = key
     self._parent_path = parent
-    self._flat_nodes = file_tree(files, parent=parent, flat=True, key=lambda x: x[1])
-    self._optional_file_ids = set(optional_file_ids)
+    # Display names and absolute paths depend only on the tree, so they
+    # are computed once here instead of on every render pass.
+    self._entries = []
+    for node in file_tree(files, parent=parent, flat=True, key=lambda x: x[1]):
+      name = '  ' * node.depth() + os.path.basename(node['path'])
+      if node['isdir']:
+        name += '/'
+      self._entries.append((node, name, os.path.join(parent, node['path'])))
+    self._optional_file_ids = optional_file_ids
     self.layout_changed()
 
   def set_overwrite(self, overwrite):
+    if overwrite == self._overwrite:
+      return
     self._overwrite = overwrite
+    # Only the red/yellow entries depend on the flag -- recolor them in
+    # place instead of rebuilding the whole widget group.
+    dialog = self.dialog
+    if dialog:
+      color = COLOR_YELLOW if overwrite else COLOR_RED
+      for widget_id in self._overwrite_widgets:
+        dialog.set_color(widget_id, c4d.COLOR_TEXT, color)
 
   def render(self, dialog):
     layout_flags = get_layout_flags(self.layout_flags)
+    existing = files_exist(
+      full_path for node, _, full_path in self._entries
+      if not node['isdir'])
+    optional_file_ids = self._optional_file_ids
+    overwrite = self._overwrite
+    self._overwrite_widgets = []
     dialog.GroupBegin(0, layout_flags, 1, 0)
-    for node in self._flat_nodes:
-      depth = node.depth()
-      name = '  ' * depth + os.path.basename(node['path'])
-      if node['isdir']:
-        name += '/'
+    for node, name, full_path in self._entries:
       widget_id = self.alloc_id()
       dialog.AddStaticText(widget_id, c4d.BFH_LEFT, name=name)
-      full_path = os.path.join(self._parent_path, node['path'])
-      if not node['isdir'] and os.path.isfile(full_path):
-        if node['data'][0] in self._optional_file_ids:
+      if not node['isdir'] and full_path in existing:
+        if node['data'][0] in optional_file_ids:
           color = COLOR_BLUE
-        elif self._overwrite:
-          color = COLOR_YELLOW
         else:
-          color = COLOR_RED
+          color = COLOR_YELLOW if overwrite else COLOR_RED
+          self._overwrite_widgets.append(widget_id)
         dialog.set_color(widget_id, c4d.COLOR_TEXT, color)
     dialog.GroupEnd()
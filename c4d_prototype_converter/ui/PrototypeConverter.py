@@ -9,16 +9,81 @@ import shutil
 import sys
 import traceback
 import webbrowser
-from nr.c4d.utils import HashDict
 from .HelpMenu import HelpMenu
 from .FileList import FileList, COLOR_RED
-from ..utils import Node, makedirs
+from ..utils import DictNode, Node, makedirs, read_file_cached
 from ..c4dutils import unicode_refreplace, get_subcontainer, has_subcontainer
 from ..little_jinja import little_jinja
-from .. import res, refactor
+from .. import res
 
 ID_PLUGIN_CONVERTER = 1040648
 
+# Descid of the main User Data group. The render paths compare every
+# visited node against it, so it is constructed once instead of per node.
+ID_USERDATA_DESCID = c4d.DescID(c4d.ID_USERDATA)
+
+# Datatypes that map straight to a resource type name without any
+# type-specific properties, so #Converter.render_parameter() can skip
+# the if/elif ladder for them.
+_DTYPE_TYPENAME = {
+  c4d.DTYPE_BUTTON: 'BUTTON',
+  c4d.DTYPE_FILENAME: 'FILENAME',
+  c4d.CUSTOMDATATYPE_GRADIENT: 'GRADIENT',
+  c4d.CUSTOMDATATYPE_INEXCLUDE_LIST: 'IN_EXCLUDE',
+  c4d.CUSTOMDATATYPE_SPLINE: 'SPLINE',
+  c4d.DTYPE_STRING: 'STRING',
+  c4d.DTYPE_TIME: 'TIME',
+}
+
+# CUSTOMGUI values of LONG/REAL parameters that translate directly to a
+# CUSTOMGUI property in the description resource.
+_CUSTOMGUI_PROP = {
+  c4d.CUSTOMGUI_LONGSLIDER: 'CUSTOMGUI LONGSLIDER;',
+  c4d.CUSTOMGUI_CYCLEBUTTON: 'CUSTOMGUI CYCLEBUTTON;',
+  c4d.CUSTOMGUI_REALSLIDER: 'CUSTOMGUI REALSLIDER;',
+  c4d.CUSTOMGUI_REALSLIDERONLY: 'CUSTOMGUI REALSLIDERONLY;',
+  c4d.CUSTOMGUI_LONG_LAT: 'CUSTOMGUI LONG_LAT;',
+}
+
+# Maps the resource base determined by #Converter.plugin_type_info() to
+# the description group that hosts the converted parameters.
+_RESBASE_PROPGROUP = {
+  'Obase': 'ID_OBJECTPROPERTIES',
+  'Tbase': 'ID_TAGPROPERTIES',
+  'Xbase': 'ID_SHADERPROPERTIES',
+  'Mbase': 'ID_MATERIALPROPERTIES',
+}
+
+# Maps the indent-mode combobox idents to the indentation strings.
+_INDENT_BY_MODE = {
+  'tab': '\t',
+  '2space': '  ',
+  '4space': '    ',
+}
+
+# Compiled once -- translate_name() runs for every symbol and cycle
+# entry, the autofill/files patterns for every settings update.
+_RE_NON_WORD_US = re.compile(r'[^\w\d_]+')
+_RE_NON_WORD = re.compile(r'[^\w\d]+')
+
+# Matches every line start; used to indent converted code in a single
+# C-level pass instead of a Python-level split/join per line.
+_RE_LINE_START = re.compile(r'^', re.M)
+
+
+def descid_key(descid):
+  """
+  Returns a cheap hashable stand-in for a #c4d.DescID. Hashing the
+  DescID itself walks every level through the C4D binding on every
+  lookup, whereas the tuple is hashed natively by Python. Only the
+  level ids make up the key: DescID comparison treats a dtype/creator
+  of 0 as a wildcard, so including them would reject descids (eg. the
+  DESC_PARENTGROUP references) that the wildcard match accepts, and
+  userdata ids are unique per level anyway.
+  """
+
+  return tuple(descid[i].id for i in range(descid.GetDepth()))
+
 
 def userdata_tree(ud):
   """
@@ -27,26 +92,32 @@ def userdata_tree(ud):
   groups.
   """
 
-  DataNode = Node[dict]
-  params = HashDict()
+  params = {}
   root = Node[None]()
+  nodes = []
 
-  # Create a node for every parameter.
+  # Create a node for every parameter. Iterating *ud* crosses into the
+  # C4D API per element, so it is traversed only once and the parent
+  # linking below works off the collected node list instead.
   for descid, bc in ud:
-    params[descid] = DataNode(descid=descid, bc=bc)
+    node = DictNode(descid=descid, bc=bc)
+    params[descid_key(descid)] = node
+    nodes.append(node)
 
   # The main userdata group is not described in the UserData container.
   descid = c4d.DescID(c4d.DescLevel(c4d.ID_USERDATA, c4d.DTYPE_SUBCONTAINER, 0))
-  node = DataNode(descid=descid, bc=c4d.BaseContainer())
-  params[descid] = node
+  node = DictNode(descid=descid, bc=c4d.BaseContainer())
+  params[descid_key(descid)] = node
   root.add_child(node)
 
   # Establish parent-child parameter relationships.
-  for descid, bc in ud:
-    node = params[descid]
-    parent_id = bc[c4d.DESC_PARENTGROUP]
+  for node in nodes:
+    parent_id = node['bc'][c4d.DESC_PARENTGROUP]
+    if parent_id is None:
+      root.add_child(node)
+      continue
     try:
-      parent = params[parent_id]
+      parent = params[descid_key(parent_id)]
     except KeyError:
       root.add_child(node)
     else:
@@ -55,6 +126,12 @@ def userdata_tree(ud):
   return root
 
 
+# Thresholds for is_minvalue()/is_maxvalue(), parsed once instead of
+# once per call.
+_FLOAT_MIN_THRESH = float('1e' + str(sys.float_info.min_10_exp-1))
+_FLOAT_MAX_THRESH = float('1e+' + str(sys.float_info.max_10_exp-1))
+
+
 def is_minvalue(x):
   """
   Checks for very low values, that might indicate that a parameter has
@@ -64,9 +141,10 @@ def is_minvalue(x):
   if isinstance(x, int):
     return x <= 2**31
   elif isinstance(x, float):
-    return x < float('1e' + str(sys.float_info.min_10_exp-1))
+    return x < _FLOAT_MIN_THRESH
   elif isinstance(x, c4d.Vector):
-    return is_minvalue(x.x) and is_minvalue(x.y) and is_minvalue(x.z)
+    return x.x < _FLOAT_MIN_THRESH and x.y < _FLOAT_MIN_THRESH and \
+      x.z < _FLOAT_MIN_THRESH
 
 
 def is_maxvalue(x):
@@ -78,14 +156,22 @@ def is_maxvalue(x):
   if isinstance(x, int):
     return x >= 2**32-1
   elif isinstance(x, float):
-    return x > float('1e+' + str(sys.float_info.max_10_exp-1))
+    return x > _FLOAT_MAX_THRESH
   elif isinstance(x, c4d.Vector):
-    return is_maxvalue(x.x) and is_maxvalue(x.y) and is_maxvalue(x.z)
+    return x.x > _FLOAT_MAX_THRESH and x.y > _FLOAT_MAX_THRESH and \
+      x.z > _FLOAT_MAX_THRESH
 
 
 def refactor_expression_script(code, kind, symbols_map):
-  # Replace occurences of [c4d.ID_USERDATA, X] with the symbol.
-  uid_reverse_map = {did[-1].id: sym for did, sym in
+  # Importing lib2to3 parses the pickled Python grammar, which is too
+  # expensive to pay at plugin load time. Import it when a script is
+  # actually converted instead.
+  from .. import refactor
+
+  # Replace occurences of [c4d.ID_USERDATA, X] with the symbol. The map
+  # keys are #descid_key() tuples of the level ids, the last level's
+  # id is the userdata id.
+  uid_reverse_map = {key[-1]: sym for key, sym in
     symbols_map.descid_to_symbol.iteritems()}
   def subfun(x):
     if x in uid_reverse_map:
@@ -97,23 +183,26 @@ def refactor_expression_script(code, kind, symbols_map):
 
   code = refactor.indentation(code, '  ')  # To match the indentation of the plugin stub.
   code, docstring = refactor.split_docstring(code)
-  code, msg_code = refactor.split_and_refactor_global_function(
-    code, 'message', 'Message', ['self', 'op'], add_statement='return True')
-
-  member_code = msg_code
 
   if kind == 'ObjectData':
-    code, gvo_code = refactor.split_and_refactor_global_function(
-      code, 'main', 'GetVirtualObjects', ['self', 'op', 'hh'])
-    member_code += '\n\n' + gvo_code
+    main_spec = {'func_name': 'main', 'new_func_name': 'GetVirtualObjects',
+      'prepend_args': ['self', 'op', 'hh']}
   elif kind == 'TagData':
-    code, exec_code = refactor.split_and_refactor_global_function(
-      code, 'main', 'Execute', ['self', 'op', 'doc', 'host', 'bt', 'priority', 'flags'],
-      add_statement='return c4d.EXECUTIONRESULT_OK')
-    member_code += '\n\n' + exec_code
+    main_spec = {'func_name': 'main', 'new_func_name': 'Execute',
+      'prepend_args': ['self', 'op', 'doc', 'host', 'bt', 'priority', 'flags'],
+      'add_statement': 'return c4d.EXECUTIONRESULT_OK'}
   else:
     raise ValueError(kind)
 
+  # Both functions are extracted in a single parse and traversal.
+  code, (msg_code, main_code) = refactor.split_and_refactor_global_functions(
+    code, [
+      {'func_name': 'message', 'new_func_name': 'Message',
+       'prepend_args': ['self', 'op'], 'add_statement': 'return True'},
+      main_spec,
+    ])
+  member_code = msg_code + '\n\n' + main_code
+
   # Must be done last, as afterwards the *code* may no longer be valid
   # syntax if print_function was used.
   code, future_line = refactor.split_future_imports(code)
@@ -134,23 +223,29 @@ class SymbolMap(object):
   def __init__(self, prefix):
     self.curr_id = 1000
     self.symbols = collections.OrderedDict()
-    self.descid_to_symbol = HashDict()
-    self.descid_to_node = HashDict()
-    self.hardcoded_description = HashDict()
+    # Keyed by #descid_key() -- tuple hashing is much cheaper than
+    # hashing the DescID objects themselves.
+    self.descid_to_symbol = {}
+    self.descid_to_node = collections.OrderedDict()
+    self.hardcoded_description = collections.OrderedDict()
     self.prefix = prefix
+    # Last unique-suffix index per base name, so repeated collisions on
+    # the same name do not re-scan all taken indices from the start.
+    self._collision_counts = {}
 
   def translate_name(self, name, add_prefix=True, unique=True):
     name = name.replace('+', 'P').replace('-', 'N')
-    result = re.sub('[^\w\d_]+', '_', name).upper().strip('_')
+    result = _RE_NON_WORD_US.sub('_', name).upper().strip('_')
     if add_prefix:
       result = self.prefix + result
-    if unique:
-      index = 0
-      while True:
-        symbol = result + (str(index) if index != 0 else '')
-        if symbol not in self.symbols: break
+    if unique and result in self.symbols:
+      # Symbols are never removed, so the first free index can only
+      # grow -- continue where the last collision left off.
+      index = self._collision_counts.get(result, 0) + 1
+      while result + str(index) in self.symbols:
         index += 1
-      result = symbol
+      self._collision_counts[result] = index
+      result = result + str(index)
     return result
 
   def allocate_symbol(self, node):
@@ -178,9 +273,9 @@ class SymbolMap(object):
     value = self.curr_id
     self.curr_id += 1
     self.symbols[symbol] = value
-    descid = node['descid']
-    self.descid_to_symbol[descid] = symbol
-    self.descid_to_node[descid] = node
+    key = descid_key(node['descid'])
+    self.descid_to_symbol[key] = symbol
+    self.descid_to_node[key] = node
     node['symbol'] = (symbol, value)
     return symbol, value
 
@@ -195,7 +290,7 @@ class SymbolMap(object):
     return symbol + '_' + self.translate_name(cycle_name, False, False)
 
   def add_hardcoded_description(self, node, param, value):
-    params = self.hardcoded_description.setdefault(node['descid'], [])
+    params = self.hardcoded_description.setdefault(descid_key(node['descid']), [])
     params.append((param, value))
 
 
@@ -223,19 +318,30 @@ class Converter(object):
     self.write_readme = write_readme
     self.symbol_mode = symbol_mode
     self.overwrite = overwrite
+    # Cached result of #plugin_type_info(). The CheckType() calls cross
+    # into the C4D API and the link does not change over the lifetime of
+    # a Converter, so they only need to run once.
+    self._plugin_type_info = None
+    # Key/result pair of the last #files() call, see there.
+    self._files_cache = None
 
   def plugin_type_info(self):
+    if self._plugin_type_info is not None:
+      return self._plugin_type_info
     if not self.link:
       return {}
     if self.link.CheckType(c4d.Obase):
-      return {'resprefix': 'O', 'resbase': 'Obase', 'plugintype': 'Object'}
-    if self.link.CheckType(c4d.Tbase):
-      return {'resprefix': 'T', 'resbase': 'Tbase', 'plugintype': 'Tag'}
-    if self.link.CheckType(c4d.Xbase):
-      return {'resprefix': 'X', 'resbase': 'Xbase', 'plugintype': 'Shader'}
-    if self.link.CheckType(c4d.Mbase):
-      return {'resprefix': 'M', 'resbase': 'Mbase', 'plugintype': None}
-    return {}
+      result = {'resprefix': 'O', 'resbase': 'Obase', 'plugintype': 'Object'}
+    elif self.link.CheckType(c4d.Tbase):
+      result = {'resprefix': 'T', 'resbase': 'Tbase', 'plugintype': 'Tag'}
+    elif self.link.CheckType(c4d.Xbase):
+      result = {'resprefix': 'X', 'resbase': 'Xbase', 'plugintype': 'Shader'}
+    elif self.link.CheckType(c4d.Mbase):
+      result = {'resprefix': 'M', 'resbase': 'Mbase', 'plugintype': None}
+    else:
+      result = {}
+    self._plugin_type_info = result
+    return result
 
   def autofill(self, default_plugin_name='My Plugin'):
     other = Converter(self.link)
@@ -249,19 +355,19 @@ class Converter(object):
     if not self.resource_name:
       self.resource_name = other.resource_name
     if not self.resource_name:
-      self.resource_name = re.sub('[^\w\d]+', '', self.plugin_name).lower()
+      self.resource_name = _RE_NON_WORD.sub('', self.plugin_name).lower()
       self.resource_name = self.plugin_type_info().get('resprefix', '') + self.resource_name
 
     if not self.symbol_prefix:
       self.symbol_prefix = other.symbol_prefix
     if not self.symbol_prefix:
-      self.symbol_prefix = re.sub('[^\w\d]+', '_', self.plugin_name).rstrip('_').upper() + '_'
+      self.symbol_prefix = _RE_NON_WORD.sub('_', self.plugin_name).rstrip('_').upper() + '_'
 
     if not self.directory:
       self.directory = other.directory
     if not self.directory:
       write_dir = c4d.storage.GeGetC4DPath(c4d.C4D_PATH_STARTUPWRITE)
-      dirname = re.sub('[^\w\d]+', '-', self.plugin_name).lower()
+      dirname = _RE_NON_WORD.sub('-', self.plugin_name).lower()
       self.directory = os.path.join(write_dir, 'plugins', dirname)
 
     if not self.icon_file:
@@ -271,27 +377,36 @@ class Converter(object):
       self.plugin_id = other.plugin_id
 
   def files(self):
-    f = lambda s: s.format(**sys._getframe(1).f_locals)
-    j = lambda *p: os.path.join(parent_dir, *p)
+    # Called on every UI refresh, usually with unchanged fields, so the
+    # dict is only rebuilt when an input field actually changed. Callers
+    # pop entries from the result, thus a copy is handed out.
+    key = (self.directory, self.plugin_name, self.resource_name,
+           self.icon_file, self.write_plugin_stub, self.write_resources,
+           self.write_readme)
+    cached = self._files_cache
+    if cached is not None and cached[0] == key:
+      return dict(cached[1])
+    join = os.path.join
     parent_dir = self.directory or self.plugin_name
-    plugin_filename = re.sub('[^\w\d]+', '-', self.plugin_name).lower()
+    plugin_filename = _RE_NON_WORD.sub('-', self.plugin_name).lower()
     plugin_type_info = self.plugin_type_info()
     result = {'directory': parent_dir}
     if self.write_resources:
       result.update({
-        'c4d_symbols': j('res', 'c4d_symbols.h'),
-        'header': j('res', 'description', f('{self.resource_name}.h')),
-        'description': j('res', 'description', f('{self.resource_name}.res')),
-        'strings_us': j('res', 'strings_us', 'description', f('{self.resource_name}.str'))
+        'c4d_symbols': join(parent_dir, 'res', 'c4d_symbols.h'),
+        'header': join(parent_dir, 'res', 'description', self.resource_name + '.h'),
+        'description': join(parent_dir, 'res', 'description', self.resource_name + '.res'),
+        'strings_us': join(parent_dir, 'res', 'strings_us', 'description', self.resource_name + '.str')
       })
     if self.write_plugin_stub and plugin_type_info.get('plugintype'):
-      result['plugin'] = j(f('{plugin_filename}.pyp'))
+      result['plugin'] = join(parent_dir, plugin_filename + '.pyp')
     if self.write_readme:
-      result['readme'] = j('README.md')
+      result['readme'] = join(parent_dir, 'README.md')
     if self.icon_file:
       suffix = os.path.splitext(self.icon_file)[1]
-      result['icon'] = j('res', 'icons', f('{self.plugin_name}{suffix}'))
-    return result
+      result['icon'] = join(parent_dir, 'res', 'icons', self.plugin_name + suffix)
+    self._files_cache = (key, result)
+    return dict(result)
 
   def optional_file_ids(self):
     return ('directory', 'c4d_symbols')
@@ -309,16 +424,21 @@ class Converter(object):
     plugin_type_info = self.plugin_type_info()
     files = self.files()
     optionals = self.optional_file_ids()
-    if not self.overwrite:
+    # When the plugin directory does not exist yet (the common case for
+    # a fresh conversion), a single stat answers for all files below it.
+    if not self.overwrite and os.path.isdir(files['directory']):
       for k in files:
         v = files.get(k)
         if not v or k in optionals: continue
         if os.path.exists(v):
           raise IOError('File "{}" already exists'.format(v))
 
-    makedirs(os.path.dirname(files['c4d_symbols']))
+    # Create all target directories in one pass -- several of the files
+    # share the same parent, which used to be makedirs()'ed per file.
+    for dirname in set(os.path.dirname(v) for k, v in files.items() if k != 'directory'):
+      makedirs(dirname)
+
     if self.overwrite or not os.path.isfile(files['c4d_symbols']):
-      makedirs(os.path.dirname(files['c4d_symbols']))
       with open(files['c4d_symbols'], 'w') as fp:
         fp.write('#pragma once\nenum {\n};\n')
 
@@ -327,89 +447,92 @@ class Converter(object):
     ud_tree = userdata_tree(ud)
     ud_main_group = next((
       x for x in ud_tree.children
-      if x['descid'] == c4d.DescID(c4d.ID_USERDATA)
+      if x['descid'] == ID_USERDATA_DESCID
     ))
-    ud_tree.visit(lambda x: symbol_map.allocate_symbol(x) if x != ud_main_group else None, False)
+    ud_tree.visit(lambda x: symbol_map.allocate_symbol(x) if x is not ud_main_group else None, False)
+    # Flatten the tree once -- the render passes below iterate the same
+    # nodes in the same pre-order, no need to re-visit recursively.
+    ordered_nodes = []
+    ud_tree.visit(ordered_nodes.append)
 
     # Render the symbols to the description header. This will also
-    # initialize our symbol_map.
-    makedirs(os.path.dirname(files['header']))
+    # initialize our symbol_map. The render helpers append to a list so
+    # every file is written with a single call.
+    parts = ['#pragma once\nenum {\n']
+    if self.plugin_id:
+      parts.append(self.indent + '{self.resource_name} = {self.plugin_id},\n'.format(self=self))
+    for node in ordered_nodes:
+      self.render_symbol(parts, node, symbol_map)
+    parts.append('};\n')
     with open(files['header'], 'w') as fp:
-      fp.write('#pragma once\nenum {\n')
-      if self.plugin_id:
-        fp.write(self.indent + '{self.resource_name} = {self.plugin_id},\n'.format(self=self))
-      ud_tree.visit(lambda x: self.render_symbol(fp, x, symbol_map))
-      fp.write('};\n')
-
-    makedirs(os.path.dirname(files['description']))
+      fp.write(''.join(parts))
+
+    parts = ['CONTAINER {self.resource_name} {{\n'.format(self=self)]
+    # The base was already determined by plugin_type_info(), no need
+    # for another round of CheckType() calls.
+    base = plugin_type_info.get('resbase')
+    propgroup = _RESBASE_PROPGROUP.get(base)
+    if propgroup:
+      parts.append(self.indent + 'INCLUDE {base};\n'.format(base=base))
+    parts.append(self.indent + 'NAME {self.resource_name};\n'.format(self=self))
+    if propgroup:
+      parts.append(self.indent + 'GROUP {0} {{\n'.format(propgroup))
+      for node in ud_main_group.children:
+        self.render_parameter(parts, node, symbol_map, depth=2)
+      parts.append(self.indent + '}\n')
+    for node in ud_tree.children:
+      if node['descid'] == ID_USERDATA_DESCID: continue
+      self.render_parameter(parts, node, symbol_map)
+    parts.append('}\n')
     with open(files['description'], 'w') as fp:
-      fp.write('CONTAINER {self.resource_name} {{\n'.format(self=self))
-      for base, propgroup in [
-          ('Obase', 'ID_OBJECTPROPERTIES'), ('Tbase', 'ID_TAGPROPERTIES'),
-          ('Xbase', 'ID_SHADERPROPERTIES'), ('Mbase', 'ID_MATERIALPROPERTIES')]:
-        if self.link.CheckType(getattr(c4d, base)):
-          fp.write(self.indent + 'INCLUDE {base};\n'.format(base=base))
-          break
-      else:
-        propgroup = None
-      fp.write(self.indent + 'NAME {self.resource_name};\n'.format(self=self))
-      if propgroup:
-        fp.write(self.indent + 'GROUP {0} {{\n'.format(propgroup))
-        for node in ud_main_group.children:
-          self.render_parameter(fp, node, symbol_map, depth=2)
-        fp.write(self.indent + '}\n')
-      for node in ud_tree.children:
-        if node['descid'] == c4d.DescID(c4d.ID_USERDATA): continue
-        self.render_parameter(fp, node, symbol_map)
-      fp.write('}\n')
-
-    makedirs(os.path.dirname(files['strings_us']))
+      fp.write(''.join(parts))
+
+    parts = ['STRINGTABLE {self.resource_name} {{\n'.format(self=self)]
+    parts.append('{self.indent}{self.resource_name} "{self.plugin_name}";\n'.format(self=self))
+    for node in ordered_nodes:
+      self.render_symbol_string(parts, node, symbol_map)
+    parts.append('}\n')
     with open(files['strings_us'], 'w') as fp:
-      fp.write('STRINGTABLE {self.resource_name} {{\n'.format(self=self))
-      fp.write('{self.indent}{self.resource_name} "{self.plugin_name}";\n'.format(self=self))
-      ud_tree.visit(lambda x: self.render_symbol_string(fp, x, symbol_map))
-      fp.write('}\n')
+      fp.write(''.join(parts))
 
     if 'plugin' in files and (self.overwrite or not os.path.isfile(files['plugin'])):
-      makedirs(os.path.dirname(files['plugin']))
-      with open(res.local('../templates/node_plugin.txt')) as fp:
-        template = fp.read()
+      template = read_file_cached(res.local('../templates/node_plugin.txt'))
 
       Opython = 1023866
       plugin_flags = ''
-      if self.link.CheckType(Opython) or self.link.CheckType(c4d.Tpython):
-        if self.link.CheckType(Opython):
-          kind = 'ObjectData'
-          code = self.link[c4d.OPYTHON_CODE]
-          plugin_flags = 'c4d.OBJECT_GENERATOR'
-        else:
-          kind = 'TagData'
-          code = self.link[c4d.TPYTHON_CODE]
-          plugin_flags = 'c4d.TAG_VISIBLE | c4d.TAG_EXPRESSION'
+      if self.link.CheckType(Opython):
+        kind = 'ObjectData'
+        code = self.link[c4d.OPYTHON_CODE]
+        plugin_flags = 'c4d.OBJECT_GENERATOR'
+        code_parts = refactor_expression_script(code, kind, symbol_map)
+      elif self.link.CheckType(c4d.Tpython):
+        kind = 'TagData'
+        code = self.link[c4d.TPYTHON_CODE]
+        plugin_flags = 'c4d.TAG_VISIBLE | c4d.TAG_EXPRESSION'
         code_parts = refactor_expression_script(code, kind, symbol_map)
       else:
         code_parts = {}
 
       if code_parts.get('member_code'):
         # Indent the code appropriately for the plugin stub.
-        code_parts['member_code'] = '\n'.join('  ' + l
-          for l in code_parts['member_code'].split('\n'))
+        code_parts['member_code'] = _RE_LINE_START.sub(
+          '  ', code_parts['member_code'])
 
       context = {
         'c4d': c4d,
         'link': self.link,
         'parameters': [
-          (symbol_map.descid_to_node[did], did, bc)
-          for did, bc in ud if did in symbol_map.descid_to_node],
+          (node, node['descid'], node['bc'])
+          for node in symbol_map.descid_to_node.values()],
         'hardcoded_description': [
-          (symbol_map.descid_to_node[did], params)
-          for did, params in symbol_map.hardcoded_description.items()
+          (symbol_map.descid_to_node[key], params)
+          for key, params in symbol_map.hardcoded_description.items()
         ],
         'docstrings': code_parts.get('docstring'),
         'future_import': code_parts.get('future_line'),
         'global_code': code_parts.get('code'),
         'member_code': code_parts.get('member_code'),
-        'plugin_class': re.sub('[^\w\d]+', '', self.plugin_name) + 'Data',
+        'plugin_class': _RE_NON_WORD.sub('', self.plugin_name) + 'Data',
         'plugin_type': plugin_type_info['plugintype'],
         'plugin_id': self.plugin_id,
         'plugin_name': self.plugin_name,
@@ -419,10 +542,15 @@ class Converter(object):
         'symbol_mode': self.symbol_mode,
       }
       code = little_jinja(template, context)
-      # Write the code for now so you can inspect it should refactoring go wrong.
-      with open(files['plugin'], 'w') as fp:
-        fp.write(code)
-      code = refactor.indentation(code, self.indent)
+      from .. import refactor
+      try:
+        code = refactor.indentation(code, self.indent)
+      except Exception:
+        # Dump the unrefactored code so you can inspect what the
+        # refactoring choked on, then let the error propagate.
+        with open(files['plugin'], 'w') as fp:
+          fp.write(code)
+        raise
       with open(files['plugin'], 'w') as fp:
         fp.write(code)
     else:
@@ -433,33 +561,36 @@ class Converter(object):
       if docstring.startswith('"'): docstring = docstring.strip('"')
       elif docstring.startswith("'"): docstring = docstring.strip("'")
       with open(files['readme'], 'w') as fp:
-        fp.write('# {0}\n\n'.format(self.plugin_name))
-        fp.write(docstring)
-        fp.write('\n')
+        fp.write('# {0}\n\n{1}\n'.format(self.plugin_name, docstring))
 
     if self.icon_file and self.icon_file != files['icon']:
-      makedirs(os.path.dirname(files['icon']))
       try:
-        shutil.copy(self.icon_file, files['icon'])
+        shutil.copyfile(self.icon_file, files['icon'])
       except shutil.Error as exc:
         print('Warning: Error copying icon:', exc)
 
-  def render_symbol(self, fp, node, symbol_map):
-    if not node.data or node['descid'] == c4d.DescID(c4d.ID_USERDATA):
+  def render_symbol(self, out, node, symbol_map):
+    if not node.data or node['descid'] == ID_USERDATA_DESCID:
       return
 
     sym, value = node['symbol']
     if not sym:
       return
 
-    fp.write(self.indent + '{} = {},\n'.format(sym, value))
+    out.append(self.indent + '{} = {},\n'.format(sym, value))
 
-    children = node['bc'].GetContainerInstance(c4d.DESC_CYCLE)
+    # Only LONG parameters can carry a CYCLE container, skip the C4D
+    # call for every other datatype.
+    if node['descid'][-1].dtype == c4d.DTYPE_LONG:
+      children = node['bc'].GetContainerInstance(c4d.DESC_CYCLE)
+    else:
+      children = None
     if children:
+      indent2 = self.indent * 2
       cycle_symbols = []
       for value, name in children:
         sym = symbol_map.get_cycle_symbol(node, name)
-        fp.write(self.indent * 2 + '{} = {},\n'.format(sym, value))
+        out.append(indent2 + '{} = {},\n'.format(sym, value))
         cycle_symbols.append((sym, value))
     else:
       cycle_symbols = None
@@ -467,34 +598,46 @@ class Converter(object):
 
     return sym
 
-  def render_parameter(self, fp, node, symbol_map, depth=1):
+  def render_parameter(self, out, node, symbol_map, depth=1):
     bc = node['bc']
     symbol = node['symbol'][0]
     dtype = node['descid'][-1].dtype
+    # The two indentation strings are needed many times per parameter,
+    # compute them only once per call.
+    indent = self.indent * depth
+    indent1 = indent + self.indent
     if dtype == c4d.DTYPE_GROUP:
-      fp.write(self.indent * depth + 'GROUP {} {{\n'.format(symbol))
+      out.append(indent + 'GROUP {} {{\n'.format(symbol))
       if bc[c4d.DESC_DEFAULT]:
-        fp.write(self.indent * (depth+1) + 'DEFAULT 1;\n')
+        out.append(indent1 + 'DEFAULT 1;\n')
       if bc[c4d.DESC_TITLEBAR]:
         pass # TODO
       if bc.GetInt32(c4d.DESC_COLUMNS) not in (0, 1):
-        fp.write(self.indent * (depth+1) + 'COLUMNS {};\n'.format(bc[c4d.DESC_COLUMNS]))
+        out.append(indent1 + 'COLUMNS {};\n'.format(bc[c4d.DESC_COLUMNS]))
       if bc[c4d.DESC_GROUPSCALEV]:
-        fp.write(self.indent * (depth+1) + 'SCALE_V;\n')
+        out.append(indent1 + 'SCALE_V;\n')
       for child in node.children:
-        self.render_parameter(fp, child, symbol_map, depth+1)
-      fp.write(self.indent * depth + '}\n')
+        self.render_parameter(out, child, symbol_map, depth+1)
+      out.append(indent + '}\n')
     else:
-      typename = None
+      typename = _DTYPE_TYPENAME.get(dtype)
       props = []
+      # Every bc[...] access crosses into the C4D API, so values that
+      # are needed more than once are read into locals up front.
       default = bc[c4d.DESC_DEFAULT]
+      customgui = bc[c4d.DESC_CUSTOMGUI]
+      unit = bc[c4d.DESC_UNIT]
+      animate = bc[c4d.DESC_ANIMATE]
 
-      if bc[c4d.DESC_ANIMATE] == c4d.DESC_ANIMATE_OFF:
+      if animate == c4d.DESC_ANIMATE_OFF:
         props.append('ANIM OFF;')
-      elif bc[c4d.DESC_ANIMATE] == c4d.DESC_ANIMATE_MIX:
+      elif animate == c4d.DESC_ANIMATE_MIX:
         props.append('ANIM MIX;')
 
-      if dtype == c4d.DTYPE_BOOL:
+      if typename is not None:
+        pass  # No type-specific properties.
+
+      elif dtype == c4d.DTYPE_BOOL:
         typename = 'BOOL'
         if default is not None:
           props.append('DEFAULT 1;' if default else 'DEFAULT 0;')
@@ -504,7 +647,7 @@ class Converter(object):
         typecast = int if dtype == c4d.DTYPE_LONG else float
         cycle = bc[c4d.DESC_CYCLE]
         has_cycle = (dtype == c4d.DTYPE_LONG and cycle)
-        multiplier = 100 if (not has_cycle and bc[c4d.DESC_UNIT] == c4d.DESC_UNIT_PERCENT) else 1
+        multiplier = 100 if (not has_cycle and unit == c4d.DESC_UNIT_PERCENT) else 1
 
         # Note: We do not multiply the DEFAULT property value by the
         # multiplier, as for the UNIT_PERCENT a DEFAULT of 1 is already
@@ -525,35 +668,27 @@ class Converter(object):
         elif isinstance(default, (int, float)):
           props.append('DEFAULT {};'.format(typecast(default)))
 
-        if bc[c4d.DESC_CUSTOMGUI] == c4d.CUSTOMGUI_LONGSLIDER:
-          props.append('CUSTOMGUI LONGSLIDER;')
-        elif bc[c4d.DESC_CUSTOMGUI] == c4d.CUSTOMGUI_CYCLEBUTTON:
-          props.append('CUSTOMGUI CYCLEBUTTON;')
-        elif bc[c4d.DESC_CUSTOMGUI] == c4d.CUSTOMGUI_REALSLIDER:
-          props.append('CUSTOMGUI REALSLIDER;')
-        elif bc[c4d.DESC_CUSTOMGUI] == c4d.CUSTOMGUI_REALSLIDERONLY:
-          props.append('CUSTOMGUI REALSLIDERONLY;')
-        elif bc[c4d.DESC_CUSTOMGUI] == c4d.CUSTOMGUI_LONG_LAT:
-          props.append('CUSTOMGUI LONG_LAT;')
-        # QuickTab CustomGUI (btw. for some reason not the same as
-        # c4d.CUSTOMGUI_QUICKTAB)
-        elif bc[c4d.DESC_CUSTOMGUI] == 200000281:
-          symbol_map.add_hardcoded_description(node, 'c4d.DESC_CUSTOMGUI', 200000281)
-        # RadioButtons CustomGUI.
-        elif bc[c4d.DESC_CUSTOMGUI] == 1019603:
-          symbol_map.add_hardcoded_description(node, 'c4d.DESC_CUSTOMGUI', 1019603)
-        elif bc[c4d.DESC_CUSTOMGUI] in (c4d.CUSTOMGUI_REAL, c4d.CUSTOMGUI_LONG, c4d.CUSTOMGUI_CYCLE):
+        customgui_prop = _CUSTOMGUI_PROP.get(customgui)
+        if customgui_prop is not None:
+          props.append(customgui_prop)
+        # QuickTab and RadioButtons CustomGUI (btw. the former is for
+        # some reason not the same as c4d.CUSTOMGUI_QUICKTAB)
+        elif customgui in (200000281, 1019603):
+          symbol_map.add_hardcoded_description(node, 'c4d.DESC_CUSTOMGUI', customgui)
+        elif customgui in (c4d.CUSTOMGUI_REAL, c4d.CUSTOMGUI_LONG, c4d.CUSTOMGUI_CYCLE):
           pass  # Default
         else:
-          print('Note: unknown customgui:', bc[c4d.DESC_NAME], bc[c4d.DESC_CUSTOMGUI])
+          print('Note: unknown customgui:', bc[c4d.DESC_NAME], customgui)
 
         if not has_cycle:
-          if bc.GetType(c4d.DESC_MIN) == dtype and not is_minvalue(bc[c4d.DESC_MIN]):
-            props.append('MIN {};'.format(bc[c4d.DESC_MIN] * multiplier))
-          if bc.GetType(c4d.DESC_MAX) == dtype and not is_maxvalue(bc[c4d.DESC_MAX]):
-            props.append('MAX {};'.format(bc[c4d.DESC_MAX] * multiplier))
-
-          if bc[c4d.DESC_CUSTOMGUI] in (c4d.CUSTOMGUI_LONGSLIDER, c4d.CUSTOMGUI_REALSLIDER, c4d.CUSTOMGUI_REALSLIDERONLY):
+          minval = bc[c4d.DESC_MIN]
+          if bc.GetType(c4d.DESC_MIN) == dtype and not is_minvalue(minval):
+            props.append('MIN {};'.format(minval * multiplier))
+          maxval = bc[c4d.DESC_MAX]
+          if bc.GetType(c4d.DESC_MAX) == dtype and not is_maxvalue(maxval):
+            props.append('MAX {};'.format(maxval * multiplier))
+
+          if customgui in (c4d.CUSTOMGUI_LONGSLIDER, c4d.CUSTOMGUI_REALSLIDER, c4d.CUSTOMGUI_REALSLIDERONLY):
             if bc.GetType(c4d.DESC_MINSLIDER) == dtype:
               props.append('MINSLIDER {};'.format(bc[c4d.DESC_MINSLIDER] * multiplier))
             if bc.GetType(c4d.DESC_MAXSLIDER) == dtype:
@@ -563,13 +698,10 @@ class Converter(object):
             step = bc[c4d.DESC_STEP] * multiplier
             props.append('STEP {};'.format(step))
 
-      elif dtype == c4d.DTYPE_BUTTON:
-        typename = 'BUTTON'
-
       elif dtype in (c4d.DTYPE_COLOR, c4d.DTYPE_VECTOR):
         typename = 'COLOR' if dtype == c4d.DTYPE_COLOR else 'VECTOR'
         vecprop = lambda n, x: '{0} {1.x} {1.y} {1.z};'.format(n, x)
-        multiplier = 100 if (bc[c4d.DESC_UNIT] == c4d.DESC_UNIT_PERCENT) else 1
+        multiplier = 100 if (unit == c4d.DESC_UNIT_PERCENT) else 1
         if isinstance(default, c4d.Vector):
           props.append(vecprop('DEFAULT', default))
         if dtype == c4d.DTYPE_VECTOR:
@@ -577,22 +709,13 @@ class Converter(object):
             props.append(vecprop('MIN', bc.GetVector(c4d.DESC_MIN) * multiplier))
           if bc.GetType(c4d.DESC_MAX) == c4d.DTYPE_VECTOR and not is_maxvalue(bc[c4d.DESC_MAX]):
             props.append(vecprop('MAX', bc.GetVector(c4d.DESC_MAX) * multiplier))
-          if bc[c4d.DESC_CUSTOMGUI] == c4d.CUSTOMGUI_SUBDESCRIPTION:
+          if customgui == c4d.CUSTOMGUI_SUBDESCRIPTION:
             props.append('CUSTOMGUI SUBDESCRIPTION;')
           if bc.GetType(c4d.DESC_STEP) == c4d.DTYPE_VECTOR:
             props.append(vecprop('STEP', bc[c4d.DESC_STEP] * multiplier))
 
-      elif dtype == c4d.DTYPE_FILENAME:
-        typename = 'FILENAME'
-
-      elif dtype == c4d.CUSTOMDATATYPE_GRADIENT:
-        typename = 'GRADIENT'
-
-      elif dtype == c4d.CUSTOMDATATYPE_INEXCLUDE_LIST:
-        typename = 'IN_EXCLUDE'
-
       elif dtype == c4d.DTYPE_BASELISTLINK:
-        if bc[c4d.DESC_CUSTOMGUI] == c4d.CUSTOMGUI_TEXBOX:
+        if customgui == c4d.CUSTOMGUI_TEXBOX:
           typename = 'SHADERLINK'
         else:
           typename = 'LINK'
@@ -612,15 +735,6 @@ class Converter(object):
             if props[-1] == 'ACCEPT {  }':
               props.pop()
 
-      elif dtype == c4d.CUSTOMDATATYPE_SPLINE:
-        typename = 'SPLINE'
-
-      elif dtype == c4d.DTYPE_STRING:
-        typename = 'STRING'
-
-      elif dtype == c4d.DTYPE_TIME:
-        typename = 'TIME'
-
       elif dtype == c4d.DTYPE_SEPARATOR:
         typename = 'SEPARATOR'
         if bc[c4d.DESC_SEPARATORLINE]:
@@ -632,52 +746,56 @@ class Converter(object):
 
       # Handle units.
       if dtype in (c4d.DTYPE_LONG, c4d.DTYPE_REAL, c4d.DTYPE_VECTOR):
-        if bc[c4d.DESC_UNIT] == c4d.DESC_UNIT_PERCENT:
+        if unit == c4d.DESC_UNIT_PERCENT:
           props.append('UNIT PERCENT;')
-        elif bc[c4d.DESC_UNIT] == c4d.DESC_UNIT_DEGREE:
+        elif unit == c4d.DESC_UNIT_DEGREE:
           props.append('UNIT DEGREE;')
-        elif bc[c4d.DESC_UNIT] == c4d.DESC_UNIT_METER:
+        elif unit == c4d.DESC_UNIT_METER:
           props.append('UNIT METER;')
 
-      fp.write(self.indent * depth + typename)
+      out.append(indent + typename)
       if symbol:
-        fp.write(' ' + symbol)
-      fp.write(' {')
+        out.append(' ' + symbol)
+      out.append(' {')
 
       if any('\n' in x for x in props):
-        fp.write('\n')
+        out.append('\n')
         single, multi = [], []
         for prop in props:
           prop = prop.rstrip()
           if '\n' in prop: multi.append(prop)
           else: single.append(prop)
         if single:
-          fp.write(self.indent * (depth+1) + ' '.join(single) + '\n')
+          out.append(indent1 + ' '.join(single) + '\n')
         for prop in multi:
           for line in prop.split('\n'):
-            fp.write(self.indent * (depth+1) + line + '\n')
-        fp.write(self.indent * depth + '}\n')
+            out.append(indent1 + line + '\n')
+        out.append(indent + '}\n')
       else:
-        fp.write(' ' + ' '.join(props) + (' ' if props else ''))
-        fp.write('}\n')
+        out.append(' ' + ' '.join(props) + (' ' if props else ''))
+        out.append('}\n')
 
-  def render_symbol_string(self, fp, node, symbol_map):
-    if not node.data or node['descid'] == c4d.DescID(c4d.ID_USERDATA):
+  def render_symbol_string(self, out, node, symbol_map):
+    if not node.data or node['descid'] == ID_USERDATA_DESCID:
       return
     symbol = node['symbol'][0]
     if not symbol:
       return
-    name = unicode_refreplace(node['bc'][c4d.DESC_NAME])
-    fp.write(self.indent + '{} "{}";\n'.format(symbol, name))
-    cycle = node['bc'][c4d.DESC_CYCLE]
-    icons = node['bc'][c4d.DESC_CYCLEICONS]
-    for item_id, name in (cycle or []):
-      name = unicode_refreplace(name)
-      strname = name
-      if icons and icons[item_id]:
-        strname += '&i' + str(icons[item_id])
-      fp.write(self.indent * 2 + '{} "{}";\n'.format(
-        symbol_map.get_cycle_symbol(node, name), strname))
+    bc = node['bc']
+    name = unicode_refreplace(bc[c4d.DESC_NAME])
+    out.append(self.indent + '{} "{}";\n'.format(symbol, name))
+    # See #render_symbol() -- cycles only exist on LONG parameters.
+    cycle = bc[c4d.DESC_CYCLE] if node['descid'][-1].dtype == c4d.DTYPE_LONG else None
+    if cycle:
+      icons = bc[c4d.DESC_CYCLEICONS]
+      indent2 = self.indent * 2
+      for item_id, name in cycle:
+        name = unicode_refreplace(name)
+        strname = name
+        if icons and icons[item_id]:
+          strname += '&i' + str(icons[item_id])
+        out.append(indent2 + '{} "{}";\n'.format(
+          symbol_map.get_cycle_symbol(node, name), strname))
 
   def save_to_link(self):
     if not self.link:
@@ -742,7 +860,7 @@ class PrototypeConverter(nr.c4d.ui.Component):
   def get_converter(self):
     symbol_mode = self['symbol_mode'].active_item.ident.encode()
     indent_mode = self['indent_mode'].active_item.ident.encode()
-    indent = {'tab': '\t', '2space': '  ', '4space': '    '}[indent_mode]
+    indent = _INDENT_BY_MODE[indent_mode]
     return Converter(
       link = self['source'].get_link(),
       plugin_name = self['plugin_name'].value,
@@ -759,9 +877,12 @@ class PrototypeConverter(nr.c4d.ui.Component):
       indent = indent
     )
 
-  def on_change(self, widget):
-    cnv = self.get_converter()
-    cnv.autofill()
+  def on_change(self, widget, cnv=None):
+    # Handlers that already built a converter from the current widget
+    # state pass it in, saving a second round of widget reads.
+    if cnv is None:
+      cnv = self.get_converter()
+      cnv.autofill()
     files = cnv.files()
     parent = os.path.dirname(files.pop('directory'))
     self['filelist'].set_files(files, parent, cnv.optional_file_ids())
@@ -773,15 +894,13 @@ class PrototypeConverter(nr.c4d.ui.Component):
     self['icon_file'].set_helptext(cnv.icon_file)
     self['plugin_directory'].set_helptext(parent)
 
-    color = COLOR_RED if not cnv.link else None
+    has_link = bool(cnv.link)
+    id_valid = cnv.plugin_id.isdigit()
+    color = COLOR_RED if not has_link else None
     self['source'].previous_sibling.set_color(color)
-    color = COLOR_RED if not cnv.plugin_id.isdigit() else None
+    color = COLOR_RED if not id_valid else None
     self['plugin_id'].parent.previous_sibling.set_color(color)
-
-    enable = True
-    if not cnv.link or not cnv.plugin_id.isdigit():
-      enable = False
-    self['create'].enabled = enable
+    self['create'].enabled = has_link and id_valid
 
   def on_create(self, button):
     cnv = self.get_converter()
@@ -795,7 +914,7 @@ class PrototypeConverter(nr.c4d.ui.Component):
       cnv.save_to_link()
       print('Saved settings to object "{}".'.format(cnv.link.GetName()))
       c4d.storage.ShowInFinder(cnv.files()['directory'])
-    self.on_change(None)
+    self.on_change(None, cnv)
 
   def on_get_plugin_id(self, button):
     webbrowser.open('http://www.plugincafe.com/forum/developer.asp')
@@ -10,13 +10,52 @@ import webbrowser
 from .HelpMenu import HelpMenu
 from .FileList import FileList, COLOR_RED
 from ..little_jinja import little_jinja
-from ..utils import makedirs
-from .. import res, refactor
+from ..utils import makedirs, read_file_cached
+from .. import res
 
 ID_SCRIPT_CONVERTER = 1040671
 
+_RE_NON_WORD = re.compile(r'[^\w\d]+')
+
+# Matches every line start; used to indent converted code in a single
+# C-level pass instead of a Python-level split/join per line.
+_RE_LINE_START = re.compile(r'^', re.M)
+
+# Maps the indent-mode combobox idents to the indentation strings.
+_INDENT_BY_MODE = {
+  'tab': '\t',
+  '2space': '  ',
+  '4space': '    ',
+}
+
+_slug_cache = {}
+
+
+def slugify(name):
+  """
+  Returns the lower-cased, dash-separated form of *name* that is used
+  for the plugin filenames. Memoized because #Converter.autofill() and
+  #Converter.files() slugify the same plugin name on every UI refresh.
+  """
+
+  try:
+    return _slug_cache[name]
+  except KeyError:
+    if len(_slug_cache) > 128:
+      _slug_cache.clear()
+    result = _slug_cache[name] = _RE_NON_WORD.sub('-', name).lower()
+    return result
+
+
+_library_scripts_cache = None
+
 
 def get_library_scripts():
+  # The recursive directory walk is repeated on every dialog relayout
+  # otherwise; the script library rarely changes while C4D is running.
+  global _library_scripts_cache
+  if _library_scripts_cache is not None:
+    return _library_scripts_cache
   dirs = [os.path.join(c4d.storage.GeGetC4DPath(x), 'scripts')
     for x in [c4d.C4D_PATH_LIBRARY, c4d.C4D_PATH_LIBRARY_USER]]
   dirs += os.getenv('C4D_SCRIPTS_DIR', '').split(os.pathsep)
@@ -39,10 +78,13 @@ def get_library_scripts():
     dirname = dirname.strip()
     if dirname:
       recurse(dirname)
+  _library_scripts_cache = result
   return result
 
 
 def refactor_command_script(code):
+  # Deferred so that lib2to3's grammar is not loaded at plugin startup.
+  from .. import refactor
   code = refactor.indentation(code, '  ')  # To match the indentation of the plugin stub.
   code, docstring = refactor.split_docstring(code)
   code, exec_func = refactor.split_and_refactor_global_function(
@@ -53,11 +95,8 @@ def refactor_command_script(code):
     member_code = exec_func
     code = refactor.strip_main_check(code)
   else:
-    lines = ['def Execute(self, doc):']
-    for line in code.split('\n'):
-      lines.append('  ' + line)
-    lines.append('  return True')
-    member_code = '\n'.join(lines)
+    member_code = ('def Execute(self, doc):\n' +
+      _RE_LINE_START.sub('  ', code) + '\n  return True')
     code = ''
 
   return {
@@ -76,6 +115,11 @@ class Converter(object):
 
   SCRIPT_FILE_METADATA_CACHE = {}
 
+  # Icon filename found next to a script, keyed by the script filename.
+  # The suffix probing below costs up to four stats and runs on every
+  # UI refresh otherwise.
+  ICON_FILE_CACHE = {}
+
   @classmethod
   def get_script_file_metadata(cls, filename):
     if filename in cls.SCRIPT_FILE_METADATA_CACHE:
@@ -105,6 +149,8 @@ class Converter(object):
     self.indent = indent
     self.write_readme = write_readme
     self.overwrite = overwrite
+    # Key/result pair of the last #files() call, see there.
+    self._files_cache = None
 
   def autofill(self, default_plugin_name='My Plugin'):
     if not self.plugin_name:
@@ -118,25 +164,37 @@ class Converter(object):
         self.plugin_name = default_plugin_name
     if not self.directory:
       write_dir = c4d.storage.GeGetC4DPath(c4d.C4D_PATH_STARTUPWRITE)
-      dirname = re.sub('[^\w\d]+', '-', self.plugin_name).lower()
+      dirname = slugify(self.plugin_name)
       self.directory = os.path.join(write_dir, 'plugins', dirname)
     if not self.plugin_help:
       metadata = self.get_script_file_metadata(self.script_file)
       self.plugin_help = metadata.get('description')
     if not self.icon_file:
       if self.script_file:
-        for suffix in ('.tif', '.tiff', '.png', '.jpg'):
-          self.icon_file = os.path.splitext(self.script_file)[0] + suffix
-          if os.path.isfile(self.icon_file):
-            break
-        else:
-          self.icon_file = None
+        try:
+          self.icon_file = self.ICON_FILE_CACHE[self.script_file]
+        except KeyError:
+          for suffix in ('.tif', '.tiff', '.png', '.jpg'):
+            self.icon_file = os.path.splitext(self.script_file)[0] + suffix
+            if os.path.isfile(self.icon_file):
+              break
+          else:
+            self.icon_file = None
+          self.ICON_FILE_CACHE[self.script_file] = self.icon_file
     if not self.icon_file:
       self.icon_file = res.local('../icons/default-icon.tiff')
 
   def files(self):
+    # Called on every UI refresh, usually with unchanged fields, so the
+    # dict is only rebuilt when an input field actually changed. Callers
+    # pop entries from the result, thus a copy is handed out.
+    key = (self.directory, self.plugin_name, self.icon_file,
+           self.write_readme)
+    cached = self._files_cache
+    if cached is not None and cached[0] == key:
+      return dict(cached[1])
     parent_dir = self.directory or self.plugin_name
-    plugin_filename = re.sub('[^\w\d]+', '-', self.plugin_name).lower()
+    plugin_filename = slugify(self.plugin_name)
     result = {
       'directory': parent_dir,
       'plugin': os.path.join(parent_dir, plugin_filename + '.pyp')
@@ -146,7 +204,8 @@ class Converter(object):
       result['icon'] = os.path.join(parent_dir, 'res/icons/{0}{1}'.format(plugin_filename, suffix))
     if self.write_readme:
       result['readme'] = os.path.join(parent_dir, 'README.md')
-    return result
+    self._files_cache = (key, result)
+    return dict(result)
 
   def create(self):
     files = self.files()
@@ -160,11 +219,11 @@ class Converter(object):
     with open(self.script_file) as fp:
       code_parts = refactor_command_script(fp.read())
     # Indent the code appropriately for the plugin stub.
-    member_code = '\n'.join('  ' + l for l in code_parts['member_code'].split('\n'))
+    member_code = _RE_LINE_START.sub('  ', code_parts['member_code'])
     context = {
       'plugin_name': self.plugin_name,
       'plugin_id': self.plugin_id.strip(),
-      'plugin_class': re.sub('[^\w\d]+', '', self.plugin_name),
+      'plugin_class': _RE_NON_WORD.sub('', self.plugin_name),
       'plugin_icon': 'res/icons/' + os.path.basename(files['icon']) if files.get('icon') else None,
       'future_import': code_parts['future_line'],
       'global_code': code_parts['code'],
@@ -172,12 +231,11 @@ class Converter(object):
       'plugin_help': self.plugin_help,
       'docstrings': code_parts['docstring']
     }
-    with open(res.local('../templates/command_plugin.txt')) as fp:
-      template = fp.read()
+    template = read_file_cached(res.local('../templates/command_plugin.txt'))
     if files.get('icon') and files.get('icon') != self.icon_file:
       makedirs(os.path.dirname(files['icon']))
       try:
-        shutil.copy(self.icon_file, files['icon'])
+        shutil.copyfile(self.icon_file, files['icon'])
       except shutil.Error as exc:
         print('Warning: Error copying icon:', exc)
     print('Creating', files['plugin'])
@@ -189,6 +247,7 @@ class Converter(object):
       fp.write(code)
 
     # Update indentation.
+    from .. import refactor
     code = refactor.indentation(code, self.indent)
     with open(files['plugin'], 'w') as fp:
       fp.write(code)
@@ -229,7 +288,7 @@ class ScriptConverter(nr.c4d.ui.Component):
     else:
       script_file = self.script_files[self['script'].active_index-1][0]
     indent_mode = self['indent_mode'].active_item.ident.encode()
-    indent = {'tab': '\t', '2space': '  ', '4space': '    '}[indent_mode]
+    indent = _INDENT_BY_MODE[indent_mode]
     return Converter(
       plugin_name = self['plugin_name'].value,
       plugin_help = self['plugin_help'].value,
@@ -242,14 +301,17 @@ class ScriptConverter(nr.c4d.ui.Component):
       indent = indent
     )
 
-  def on_change(self, widget):
+  def on_change(self, widget, cnv=None):
     visible = (self['script'].active_index == 0)
     item = self['script_file']
     item.visible = visible
     item.previous_sibling.visible = visible
 
-    cnv = self.get_converter()
-    cnv.autofill()
+    # Handlers that already built a converter from the current widget
+    # state pass it in, saving a second round of widget reads.
+    if cnv is None:
+      cnv = self.get_converter()
+      cnv.autofill()
     files = cnv.files()
     parent = os.path.dirname(files.pop('directory'))
     enable_create = True
@@ -288,7 +350,7 @@ class ScriptConverter(nr.c4d.ui.Component):
     else:
       c4d.storage.ShowInFinder(cnv.files()['directory'])
     finally:
-      self.on_change(None)
+      self.on_change(None, cnv)
 
   def on_get_plugin_id(self, button):
     webbrowser.open('http://www.plugincafe.com/forum/developer.asp')
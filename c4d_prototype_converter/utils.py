@@ -31,6 +31,8 @@ class nullable_ref(object):
   A weak-reference type that can represent #None.
   '''
 
+  __slots__ = ('_ref',)
+
   def __init__(self, obj):
     self.set(obj)
 
@@ -64,11 +66,34 @@ def makedirs(path, raise_on_exists=False):
       raise
 
 
+_file_cache = {}
+
+
+def read_file_cached(path):
+  '''
+  Returns the contents of the file at *path*, cached after the first
+  read. Intended for the plugin stub templates, which never change while
+  the plugin is loaded.
+  '''
+
+  try:
+    return _file_cache[path]
+  except KeyError:
+    with open(path) as fp:
+      data = fp.read()
+    _file_cache[path] = data
+    return data
+
+
 class Node(Generic['data_cls']):
   """
   Generic tree node type.
   """
 
+  # One tree easily holds hundreds of nodes, so instances carry no
+  # per-instance dict. __weakref__ is needed for the parent references.
+  __slots__ = ('data', 'parent', 'children', '__weakref__')
+
   def __init__(self, *args, **kwargs):
     if not self.__generic_bind__:
       raise TypeError('missing generic arguments for Node class')
@@ -117,10 +142,17 @@ class Node(Generic['data_cls']):
     self.parent.set(None)
 
   def visit(self, func, with_root=True, post_order=False):
+    # Iterative to avoid one Python frame per node and a possible
+    # RecursionError on deep trees. Note that *post_order* only applies
+    # to the root node -- the children have always been visited in
+    # pre-order, which this preserves.
     if with_root and not post_order:
       func(self)
-    for child in self.children:
-      child.visit(func)
+    stack = list(reversed(self.children))
+    while stack:
+      node = stack.pop()
+      func(node)
+      stack.extend(reversed(node.children))
     if with_root and post_order:
       func(self)
 
@@ -132,3 +164,22 @@ class Node(Generic['data_cls']):
       if stop_cond is not None and stop_cond(self): break
       count += 1
     return count
+
+
+class DictNode(Node[dict]):
+  """
+  A #Node specialization for plain #dict payloads. The key access methods
+  skip the #isinstance() dispatch of the base class, which sits on the
+  hot path when rendering large userdata trees.
+  """
+
+  __slots__ = ()
+
+  def __getitem__(self, key):
+    return self.data[key]
+
+  def __setitem__(self, key, value):
+    self.data[key] = value
+
+  def get(self, key, default=None):
+    return self.data.get(key, default)
@@ -190,6 +190,10 @@ class BaseWidget(object):
       self._allocated_ids.append(result)
       self._free_id_offset = len(self._allocated_ids)
 
+    # Keep the forward index up-to-date so that the widget owning an
+    # ID can be found without scanning the whole widget hierarchy.
+    manager._param_widget_map[result] = weakref.ref(self)
+
     if name is not None:
       self._named_ids[name] = result
     return result
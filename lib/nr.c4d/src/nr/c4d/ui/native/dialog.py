@@ -39,6 +39,7 @@ class DialogWindow(c4d.gui.GeDialog):
     self._title = title or ''
     self._layout_changed_items = set()
     self._layout_changed_queued = False
+    self._color_cache = {}
 
   @property
   def title(self):
@@ -92,8 +93,13 @@ class DialogWindow(c4d.gui.GeDialog):
     self.root.manager = self.widgets
 
   def get_color(self, colorid):
-    c = self.GetColorRGB(colorid)
-    return c4d.Vector(c['r'] / 255., c['g'] / 255., c['b'] / 255.)
+    try:
+      return self._color_cache[colorid]
+    except KeyError:
+      c = self.GetColorRGB(colorid)
+      color = c4d.Vector(c['r'], c['g'], c['b']) * (1.0 / 255.0)
+      self._color_cache[colorid] = color
+      return color
 
   def set_color(self, param_id, colorid, color=None):
     if color is None:
@@ -115,6 +121,8 @@ class DialogWindow(c4d.gui.GeDialog):
   # c4d.gui.GeDialog overrides
 
   def CreateLayout(self):
+    # The color scheme may have changed since the dialog was last open.
+    self._color_cache.clear()
     self.SetTitle(self._title)
     self.root.on_render_begin()
     self.root.render(self)
@@ -125,14 +133,22 @@ class DialogWindow(c4d.gui.GeDialog):
 
   def InitValues(self):
     self.root.init_values(self)
-    self.widgets.layout_changed()
+    # Widgets whose state changed during init have marked their manager
+    # dirty themselves; no need to force another full update pass right
+    # after CreateLayout() already performed one.
     self.update_layout()
     self.widgets.process_queue()
     return True
 
   def Command(self, id, msg):
     self.widgets.process_queue()
-    result = self.root.command_event(id, msg)
+    # Dispatch directly to the widget that allocated the ID instead of
+    # scanning the whole widget hierarchy for every command event.
+    widget = self.widgets.find_widget(id)
+    if widget is not None:
+      result = bool(widget.command_event(id, msg))
+    else:
+      result = self.root.command_event(id, msg)
     self.update_layout()
     self.widgets.process_queue()
     return result
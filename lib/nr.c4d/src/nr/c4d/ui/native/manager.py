@@ -48,6 +48,7 @@ class WidgetManager(object):
     self.cid = 1000
     self._queue = Queue.Queue()
     self._id_widget_map = {}  # ID to weakref of BaseWidget
+    self._param_widget_map = {}  # Allocated dialog ID to weakref of BaseWidget
     self._layout_changed = False
     self._children = []
     if parent:
@@ -117,6 +118,25 @@ class WidgetManager(object):
       finally:
         self.cid += 1
 
+  def find_widget(self, param_id):
+    """
+    Returns the #BaseWidget that allocated the dialog element ID *param_id*
+    using #BaseWidget.alloc_id(), searching this manager and all of its
+    child managers. Returns #None if the ID is not known.
+    """
+
+    ref = self._param_widget_map.get(param_id)
+    if ref is not None:
+      widget = ref()
+      if widget is not None:
+        return widget
+      del self._param_widget_map[param_id]
+    for child in self._children:
+      widget = child.find_widget(param_id)
+      if widget is not None:
+        return widget
+    return None
+
   def remove(self):
     if self.parent:
       self.parent._children.remove(self)
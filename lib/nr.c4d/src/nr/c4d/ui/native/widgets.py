@@ -322,10 +322,12 @@ class Text(BaseWidget):
       dialog.set_color(self.get_named_id('text'), c4d.COLOR_TEXT, self.color)
 
   def set_color(self, color):
+    if color == self.color:
+      return
+    self.color = color
     dialog = self.dialog
     if dialog:
       dialog.set_color(self.get_named_id('text'), c4d.COLOR_TEXT, color)
-    color = self.color
 
 
 class Spacer(Text):
@@ -720,16 +720,36 @@ def bc_insert(bc, id, data, index):
 # A dictionary with support for some normally unhashable C4D types.
 class HashDict(_HashDict):
   SPECIALIZATIONS = {}
+  # Resolved type -> hash function, filled on demand. key_hash() runs for
+  # every dict operation, so the SPECIALIZATIONS lookup (with its fallback
+  # to the builtin hash) is resolved once per type instead of every call.
+  _DISPATCH_CACHE = {}
   @classmethod
   def specialize(cls, type):
     def decorator(func):
       cls.SPECIALIZATIONS[type] = func
+      cls._DISPATCH_CACHE.clear()
       return func
     return decorator
   def key_hash(self, key):
-    return self.SPECIALIZATIONS.get(type(key), hash)(key)
+    key_type = type(key)
+    try:
+      func = self._DISPATCH_CACHE[key_type]
+    except KeyError:
+      func = self._DISPATCH_CACHE[key_type] = \
+        self.SPECIALIZATIONS.get(key_type, hash)
+    return func(key)
+
+# Memoizes the hash of a DescID on object identity. The object itself is
+# kept in the cache entry so that the id() key cannot refer to a different,
+# recycled object.
+_hash_descid_cache = {}
 
 @HashDict.specialize(c4d.DescID)
 def hash_descid(x):
-  levels = (x[i] for i in xrange(x.GetDepth()))
-  return hash(tuple(l.id for l in levels))
+  entry = _hash_descid_cache.get(id(x))
+  if entry is not None and entry[0] is x:
+    return entry[1]
+  result = hash(tuple(x[i].id for i in xrange(x.GetDepth())))
+  _hash_descid_cache[id(x)] = (x, result)
+  return result
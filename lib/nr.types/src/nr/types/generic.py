@@ -127,7 +127,10 @@ class GenericMeta(type):
     data = {
       '__module__': cls.__module__,
       '__generic_bind__': bind_data,
-      '__generic_base__': cls
+      '__generic_base__': cls,
+      # Keep generic classes that declare __slots__ free of per-instance
+      # dicts; classes without __slots__ are unaffected.
+      '__slots__': ()
     }
     return type(type_name, (cls,), data)
 
@@ -137,7 +140,7 @@ class _GenericHelperMeta(type):
   def __getitem__(self, args):
     if not isinstance(args, tuple):
       args = (args,)
-    data = {'__generic_args__': list(args)}
+    data = {'__generic_args__': list(args), '__slots__': ()}
     return GenericMeta('Generic[{0}]'.format(args), (object,), data)
 
 
@@ -303,13 +303,17 @@ class HashDict(generic.Generic['key_hash']):
   """
 
   class KeyWrapper(object):
+    # The hash is computed once on construction -- a wrapper is hashed
+    # again for every probe and every rehash of the underlying dict,
+    # and the specialized hash functions are not necessarily cheap.
+    __slots__ = ('key', '_hash')
     def __init__(self, key, hash_func):
       self.key = key
-      self.hash_func = hash_func
+      self._hash = hash_func(key)
     def __repr__(self):
       return repr(self.key)
     def __hash__(self):
-      return self.hash_func(self.key)
+      return self._hash
     def __eq__(self, other):
       return self.key == other.key
     def __ne__(self, other):